@@ -1,6 +1,5 @@
 from flask import Flask, render_template , session, request, jsonify , send_file , abort
 import csv
-from apscheduler.schedulers.background import BackgroundScheduler
 import pandas as pd
 import os
 from dotenv import load_dotenv
@@ -17,6 +16,7 @@ from jobspy import scrape_jobs
 from openai import OpenAI
 from fpdf import FPDF
 import traceback
+from scrape_scheduler import start_scheduler, scrape_incrementally, write_atomic, load_run_history
 #                                                    env variables loading
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -66,16 +66,26 @@ def refine_resume_page():
 
 #                                              defining the webscraper function                                            
 
+SCRAPE_SITES = ["indeed", "linkedin", "zip_recruiter", "glassdoor"]
+RESULTS_WANTED = 15
+
 def webscraper():
-    jobs = scrape_jobs(
-        site_name=["indeed", "linkedin", "zip_recruiter", "glassdoor"],
+    # each source only fetches what was posted since its last successful scrape
+    return scrape_incrementally(SCRAPE_SITES, fetch_site_jobs, store_new_jobs, RESULTS_WANTED)
+
+
+def fetch_site_jobs(site, hours_old):
+    return scrape_jobs(
+        site_name=[site],
         search_term="IT",
         job_type="internship",
-        results_wanted=15,
-        hours_old=24,
+        results_wanted=RESULTS_WANTED,
+        hours_old=hours_old,
         country_indeed="france"
     )
 
+
+def store_new_jobs(jobs):
     jobs['is_remote'].fillna(0, inplace=True)
     print(f"Found {len(jobs)} jobs")
 
@@ -96,7 +106,7 @@ def webscraper():
         updated_jobs = selected_jobs
 
     # Save updated jobs to CSV
-    updated_jobs.to_csv(file_path, quoting=csv.QUOTE_NONNUMERIC, escapechar="\\", index=False)
+    write_atomic(file_path, lambda f: updated_jobs.to_csv(f, quoting=csv.QUOTE_NONNUMERIC, escapechar="\\", index=False))
 
     print(f"Appended {len(new_jobs)} new jobs to csv file.")
 
@@ -104,7 +114,7 @@ def webscraper():
         # Embed and store new jobs in your vector database
         embed_and_store(new_jobs)
 
-    return None
+    return len(new_jobs)
 # -------------------------------------------------------------------------------------------------------------------------
 
 #                                defining the embeding function + storing in the Vector-database
@@ -652,12 +662,25 @@ def generate_pdf_resume_route():
 
 # -------------------------------------------------------------------------------------------------------------------------
 
+#                                  scheduled scraping (started in every worker, only the lock holder runs the jobs)
+
+# set SCHEDULER_ENABLED=false for flask shell / one-off scripts that should not grab the leader lock
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+# app.run(debug=True) below uses the werkzeug reloader, whose parent process never reloads the code
+in_reloader_parent = __name__ == '__main__' and os.getenv("WERKZEUG_RUN_MAIN") != "true"
+if not SCHEDULER_ENABLED:
+    print("Scheduled scraping is disabled (SCHEDULER_ENABLED=false)")
+elif not in_reloader_parent:
+    scheduler = start_scheduler(webscraper)
+
+@app.route('/scheduler_runs')
+def scheduler_runs():
+    limit = request.args.get('limit', default=50, type=int)
+    return jsonify(load_run_history(limit))
+# -------------------------------------------------------------------------------------------------------------------------
+
 #                                                the main function
 if __name__ == '__main__':
-    scheduler = BackgroundScheduler()
-    # schedular to trigger every day at the given time (00:00)
-    scheduler.add_job(func=webscraper, trigger="cron", hour=16, minute=1)
-    scheduler.start()
     print(app.template_folder)
     
     
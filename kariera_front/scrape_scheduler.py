@@ -0,0 +1,298 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.combining import OrTrigger
+from apscheduler.triggers.cron import CronTrigger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+#                                         scheduler state files (shared by every worker on the host)
+STATE_FOLDER = os.getenv("SCHEDULER_STATE_FOLDER", "csv_Files")
+LOCK_PATH = os.path.join(STATE_FOLDER, "scheduler.lock")
+WATERMARKS_PATH = os.path.join(STATE_FOLDER, "scrape_watermarks.json")
+RUN_HISTORY_PATH = os.path.join(STATE_FOLDER, "scheduler_runs.jsonl")
+
+# ";"-separated list of "HH:MM" times or 5-field crontab expressions, e.g. "16:01;0 */6 * * *"
+DEFAULT_SCHEDULES = "16:01"
+# how often non-leader processes retry to take over the lock (e.g. when the leader worker dies)
+LEADER_RETRY_SECONDS = int(os.getenv("SCHEDULER_LEADER_RETRY_SECONDS", "60"))
+# look-back used for a source that never had a successful run, and the upper bound for the others
+DEFAULT_HOURS_OLD = 24
+MAX_HOURS_OLD = 24 * 7
+MAX_RUN_HISTORY = 500
+# -------------------------------------------------------------------------------------------------------------------------
+
+#                                         leader election through an exclusive file lock
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a file, held for the lifetime of the process.
+
+    The OS releases the lock when the holder exits, so another worker can take over.
+    """
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self._file = None
+        self._pid = None
+
+    @property
+    def is_leader(self):
+        # a forked child inherits the descriptor but must not consider itself the leader
+        return self._file is not None and self._pid == os.getpid()
+
+    def try_acquire(self):
+        if self.is_leader:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lock_file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        self._pid = os.getpid()
+        return True
+
+    def release(self):
+        if self._file is not None:
+            # closing the descriptor drops the flock / msvcrt lock
+            self._file.close()
+        self._file = None
+        self._pid = None
+# -------------------------------------------------------------------------------------------------------------------------
+
+#                                         per-source watermarks of the last successful scrape
+
+def _target_mode(path):
+    if os.path.exists(path):
+        return os.stat(path).st_mode & 0o777
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_atomic(path, write):
+    """Call `write(file)` on a temp file next to `path`, then swap it in so readers never see a partial file."""
+    tmp_file = tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path) or ".", suffix=".tmp",
+                                           delete=False, newline="", encoding="utf-8")
+    try:
+        with tmp_file:
+            write(tmp_file)
+        # NamedTemporaryFile creates the file 0600, keep the permissions a plain open() would give
+        os.chmod(tmp_file.name, _target_mode(path))
+        os.replace(tmp_file.name, path)
+    except BaseException:
+        if os.path.exists(tmp_file.name):
+            os.unlink(tmp_file.name)
+        raise
+
+
+def _parse_timestamp(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        # hand-edited values without an offset are taken as UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def load_watermarks(path=WATERMARKS_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable watermarks file {path}: {e}")
+        return {}
+    if not isinstance(raw, dict):
+        print(f"Ignoring malformed watermarks file {path}")
+        return {}
+    watermarks = {}
+    for source, value in raw.items():
+        try:
+            watermarks[source] = _parse_timestamp(value)
+        except (TypeError, ValueError):
+            print(f"Ignoring invalid watermark for {source}: {value!r}")
+    return watermarks
+
+
+def save_watermark(source, succeeded_at, path=WATERMARKS_PATH):
+    watermarks = load_watermarks(path)
+    watermarks[source] = succeeded_at
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    content = json.dumps({s: w.isoformat() for s, w in watermarks.items()}, indent=2)
+    write_atomic(path, lambda f: f.write(content))
+
+
+def hours_since(watermark, now=None):
+    """Look-back window (in whole hours, as expected by jobspy) covering everything after `watermark`."""
+    if watermark is None:
+        return DEFAULT_HOURS_OLD
+    now = now or datetime.now(timezone.utc)
+    hours = math.ceil((now - watermark).total_seconds() / 3600)
+    return min(max(hours, 1), MAX_HOURS_OLD)
+
+
+def filter_since_watermark(jobs, watermark):
+    """Drop postings dated before the day of `watermark` (jobspy only gives a posting date, not a time)."""
+    if watermark is None or jobs.empty or "date_posted" not in jobs.columns:
+        return jobs
+    posted = pd.to_datetime(jobs["date_posted"], errors="coerce")
+    return jobs[posted.isna() | (posted >= pd.Timestamp(watermark.date()))]
+
+
+def scrape_incrementally(sources, fetch, store, results_wanted, watermarks_path=WATERMARKS_PATH):
+    """Scrape every source from its own watermark and hand the combined postings to `store`.
+
+    `fetch(source, hours_old)` returns a DataFrame of postings and `store(jobs)` persists
+    them, returning the number of new jobs. Watermarks only move once `store` has
+    succeeded. A source that returned a full batch keeps its watermark, since
+    older postings in its window were cut off. Raises if every source failed.
+    """
+    watermarks = load_watermarks(watermarks_path)
+    scraped = []
+    advanced = {}
+    failed = []
+    for source in sources:
+        run_started_at = datetime.now(timezone.utc)
+        watermark = watermarks.get(source)
+        try:
+            jobs = fetch(source, hours_since(watermark, run_started_at))
+        except Exception as e:
+            print(f"Scraping {source} failed: {e}")
+            failed.append(source)
+            continue
+        if len(jobs) < results_wanted:
+            advanced[source] = run_started_at
+        else:
+            print(f"{source} returned a full batch of {len(jobs)} jobs, keeping its watermark")
+        jobs = filter_since_watermark(jobs, watermark)
+        # jobspy returns a column-less DataFrame when nothing matched the window
+        if not jobs.empty:
+            scraped.append(jobs)
+
+    if failed and len(failed) == len(sources):
+        raise RuntimeError(f"Scraping failed for every source: {', '.join(failed)}")
+
+    new_jobs = store(pd.concat(scraped, ignore_index=True)) if scraped else 0
+    # only move the watermarks once the postings are safely stored
+    for source, succeeded_at in advanced.items():
+        save_watermark(source, succeeded_at, watermarks_path)
+    return {"new_jobs": new_jobs, "failed_sources": failed}
+# -------------------------------------------------------------------------------------------------------------------------
+
+#                                         run history
+
+def record_run(entry, path=RUN_HISTORY_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # single appended line per run, only the leader writes here
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_run_history(limit=50, path=RUN_HISTORY_PATH):
+    limit = min(max(limit, 1), MAX_RUN_HISTORY)
+    if not os.path.exists(path):
+        return []
+    history = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                history.append(json.loads(line))
+            except ValueError:
+                # torn or hand-edited line, skip it rather than failing the whole history
+                continue
+    return history[-limit:]
+
+
+# serialises scheduled runs inside the leader process, so runs never touch the shared files concurrently
+_run_lock = threading.Lock()
+
+
+def _tracked(job_name, func):
+    def run():
+        with _run_lock:
+            started_at = datetime.now(timezone.utc)
+            start = time.monotonic()
+            entry = {"job": job_name, "pid": os.getpid(), "started_at": started_at.isoformat()}
+            try:
+                result = func()
+                entry["result"] = result
+                partial = isinstance(result, dict) and result.get("failed_sources")
+                entry["status"] = "partial" if partial else "success"
+                if partial:
+                    entry["failed_sources"] = result["failed_sources"]
+            except Exception as e:
+                entry["status"] = "error"
+                entry["error"] = str(e)
+                print(f"Scheduled job {job_name} failed: {e}")
+            entry["finished_at"] = datetime.now(timezone.utc).isoformat()
+            entry["duration_seconds"] = round(time.monotonic() - start, 3)
+            record_run(entry)
+    return run
+# -------------------------------------------------------------------------------------------------------------------------
+
+#                                         schedules + starting the scheduler in every worker
+
+def _parse_schedule(item):
+    if " " in item:
+        return CronTrigger.from_crontab(item)
+    hour, sep, minute = item.partition(":")
+    if not sep or not hour.isdigit() or not minute.isdigit():
+        raise ValueError(f"Invalid schedule {item!r}, expected 'HH:MM' or a crontab expression")
+    return CronTrigger(hour=int(hour), minute=int(minute))
+
+
+def parse_schedules(spec=None):
+    spec = spec or os.getenv("SCRAPE_SCHEDULES", DEFAULT_SCHEDULES)
+    triggers = [_parse_schedule(item.strip()) for item in spec.split(";") if item.strip()]
+    if not triggers:
+        raise ValueError(f"No schedule found in {spec!r}")
+    return triggers
+
+
+def start_scheduler(job_func, schedules=None, lock=None):
+    """Start a background scheduler that only runs `job_func` in the process holding the leader lock.
+
+    Safe to call from every worker: the others keep retrying the lock every
+    LEADER_RETRY_SECONDS and take over the schedules if the leader goes away.
+    """
+    lock = lock or LeaderLock()
+    # a single job for all the schedules, so max_instances/coalesce apply when they fire together
+    trigger = OrTrigger(parse_schedules(schedules))
+    scheduler = BackgroundScheduler(job_defaults={"coalesce": True, "max_instances": 1})
+
+    def elect():
+        if not lock.try_acquire():
+            return
+        print(f"Process {os.getpid()} is the scheduler leader")
+        scheduler.add_job(_tracked(job_func.__name__, job_func), trigger=trigger,
+                          id=job_func.__name__, replace_existing=True)
+        if scheduler.get_job("leader_election"):
+            scheduler.remove_job("leader_election")
+
+    scheduler.start()
+    elect()
+    if not lock.is_leader:
+        scheduler.add_job(elect, trigger="interval", seconds=LEADER_RETRY_SECONDS, id="leader_election")
+    return scheduler
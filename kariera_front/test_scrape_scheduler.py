@@ -0,0 +1,301 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("apscheduler")
+pd = pytest.importorskip("pandas")
+
+from apscheduler.triggers.cron import CronTrigger
+
+import scrape_scheduler
+from scrape_scheduler import (
+    DEFAULT_HOURS_OLD,
+    MAX_HOURS_OLD,
+    LeaderLock,
+    filter_since_watermark,
+    hours_since,
+    load_run_history,
+    load_watermarks,
+    parse_schedules,
+    record_run,
+    save_watermark,
+    scrape_incrementally,
+    start_scheduler,
+    write_atomic,
+)
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+def test_hours_since_without_watermark_uses_default():
+    assert hours_since(None, NOW) == DEFAULT_HOURS_OLD
+
+
+def test_hours_since_rounds_up_partial_hours():
+    assert hours_since(NOW - timedelta(hours=3, minutes=5), NOW) == 4
+    assert hours_since(NOW - timedelta(hours=3), NOW) == 3
+
+
+def test_hours_since_is_bounded():
+    assert hours_since(NOW, NOW) == 1
+    assert hours_since(NOW + timedelta(hours=2), NOW) == 1
+    assert hours_since(NOW - timedelta(days=30), NOW) == MAX_HOURS_OLD
+
+
+def test_parse_schedules_accepts_times_and_crontab():
+    triggers = parse_schedules("16:01; 0 */6 * * *;")
+    assert len(triggers) == 2
+    assert all(isinstance(t, CronTrigger) for t in triggers)
+    assert triggers[0].get_next_fire_time(None, NOW).strftime("%H:%M") == "16:01"
+    assert triggers[1].get_next_fire_time(None, NOW).strftime("%H:%M") == "12:00"
+
+
+@pytest.mark.parametrize("spec", ["16", "ab:cd", "25:00", "* * *", ";"])
+def test_parse_schedules_rejects_bad_input(spec):
+    with pytest.raises(ValueError):
+        parse_schedules(spec)
+
+
+def test_watermark_round_trip(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    assert load_watermarks(path) == {}
+    save_watermark("indeed", NOW, path)
+    save_watermark("linkedin", NOW - timedelta(hours=1), path)
+    assert load_watermarks(path) == {"indeed": NOW, "linkedin": NOW - timedelta(hours=1)}
+
+
+def test_load_watermarks_drops_invalid_and_treats_naive_as_utc(tmp_path):
+    path = tmp_path / "watermarks.json"
+    path.write_text(json.dumps({"indeed": "not a date", "linkedin": "2026-10-19T12:00:00", "glassdoor": 3}))
+    assert load_watermarks(str(path)) == {"linkedin": NOW}
+
+
+def test_load_run_history_clamps_limit_and_skips_corrupt_lines(tmp_path):
+    path = str(tmp_path / "runs.jsonl")
+    for i in range(3):
+        record_run({"run": i}, path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"run": \n')
+    assert load_run_history(0, path) == [{"run": 2}]
+    assert load_run_history(-2, path) == [{"run": 2}]
+    assert load_run_history(10, path) == [{"run": i} for i in range(3)]
+
+
+def test_leader_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    first = LeaderLock(path)
+    assert first.try_acquire()
+    assert first.is_leader
+    assert first.try_acquire()
+    # flock is per open file description, so a second instance competes even in the same process
+    second = LeaderLock(path)
+    assert not second.try_acquire()
+    assert not second.is_leader
+
+
+def test_leader_lock_released_when_holder_exits(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    module_dir = os.path.dirname(scrape_scheduler.__file__)
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import sys, scrape_scheduler; lock = scrape_scheduler.LeaderLock(sys.argv[1]); "
+         "print(lock.try_acquire(), flush=True); sys.stdin.read()", path],
+        cwd=module_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    assert holder.stdout.readline().strip() == "True"
+    assert not LeaderLock(path).try_acquire()
+    holder.stdin.close()
+    holder.wait(timeout=10)
+    assert LeaderLock(path).try_acquire()
+
+
+def test_leader_lock_release_lets_another_instance_acquire(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    first = LeaderLock(path)
+    assert first.try_acquire()
+    first.release()
+    assert not first.is_leader
+    assert LeaderLock(path).try_acquire()
+
+
+def test_write_atomic_keeps_permissions_and_cleans_up_on_failure(tmp_path):
+    path = tmp_path / "jobs.csv"
+    path.write_text("old")
+    os.chmod(path, 0o644)
+    write_atomic(str(path), lambda f: f.write("new"))
+    assert path.read_text() == "new"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+    def fail(f):
+        f.write("partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(str(path), fail)
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["jobs.csv"]
+
+
+def test_filter_since_watermark_keeps_same_day_and_undated_postings():
+    jobs = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "date_posted": ["2026-10-18", "2026-10-19", "2026-10-20", None],
+    })
+    kept = filter_since_watermark(jobs, NOW)
+    assert kept["id"].tolist() == [2, 3, 4]
+    assert filter_since_watermark(jobs, None) is jobs
+    assert filter_since_watermark(jobs.drop(columns="date_posted"), NOW)["id"].tolist() == [1, 2, 3, 4]
+    assert filter_since_watermark(pd.DataFrame(), NOW).empty
+
+
+class FakeScrape:
+    def __init__(self, results):
+        # source -> DataFrame, or an exception to raise
+        self.results = results
+        self.hours_old = {}
+        self.stored = []
+
+    def fetch(self, source, hours_old):
+        self.hours_old[source] = hours_old
+        result = self.results[source]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def store(self, jobs):
+        self.stored.append(jobs)
+        return len(jobs)
+
+
+def _jobs(*ids):
+    return pd.DataFrame({"id": list(ids), "date_posted": [None] * len(ids)})
+
+
+def test_scrape_incrementally_uses_each_source_watermark(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    recent = datetime.now(timezone.utc) - timedelta(hours=2, minutes=30)
+    save_watermark("indeed", recent, path)
+    fake = FakeScrape({"indeed": _jobs(1), "linkedin": _jobs(2, 3)})
+
+    result = scrape_incrementally(["indeed", "linkedin"], fake.fetch, fake.store, 15, path)
+
+    assert fake.hours_old == {"indeed": 3, "linkedin": DEFAULT_HOURS_OLD}
+    assert fake.stored[0]["id"].tolist() == [1, 2, 3]
+    assert result == {"new_jobs": 3, "failed_sources": []}
+    assert set(load_watermarks(path)) == {"indeed", "linkedin"}
+    assert load_watermarks(path)["indeed"] > recent
+
+
+def test_scrape_incrementally_saves_watermarks_when_nothing_was_found(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    fake = FakeScrape({"indeed": pd.DataFrame(), "linkedin": pd.DataFrame()})
+
+    result = scrape_incrementally(["indeed", "linkedin"], fake.fetch, fake.store, 15, path)
+
+    assert result == {"new_jobs": 0, "failed_sources": []}
+    assert fake.stored == []
+    assert set(load_watermarks(path)) == {"indeed", "linkedin"}
+
+
+def test_scrape_incrementally_keeps_watermarks_when_store_fails(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+
+    def store(jobs):
+        raise OSError("disk full")
+
+    fake = FakeScrape({"indeed": _jobs(1)})
+    with pytest.raises(OSError):
+        scrape_incrementally(["indeed"], fake.fetch, store, 15, path)
+    assert load_watermarks(path) == {}
+
+
+def test_scrape_incrementally_keeps_watermark_after_full_batch(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    save_watermark("indeed", NOW, path)
+    fake = FakeScrape({"indeed": _jobs(*range(15)), "linkedin": _jobs(1)})
+
+    scrape_incrementally(["indeed", "linkedin"], fake.fetch, fake.store, 15, path)
+
+    watermarks = load_watermarks(path)
+    assert watermarks["indeed"] == NOW
+    assert "linkedin" in watermarks
+
+
+def test_scrape_incrementally_reports_failed_sources(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    fake = FakeScrape({"indeed": RuntimeError("blocked"), "linkedin": _jobs(1)})
+
+    result = scrape_incrementally(["indeed", "linkedin"], fake.fetch, fake.store, 15, path)
+
+    assert result == {"new_jobs": 1, "failed_sources": ["indeed"]}
+    assert set(load_watermarks(path)) == {"linkedin"}
+
+
+def test_scrape_incrementally_raises_when_every_source_fails(tmp_path):
+    fake = FakeScrape({"indeed": RuntimeError("blocked"), "linkedin": RuntimeError("blocked")})
+    with pytest.raises(RuntimeError, match="indeed, linkedin"):
+        scrape_incrementally(["indeed", "linkedin"], fake.fetch, fake.store, 15, str(tmp_path / "w.json"))
+
+
+@pytest.mark.parametrize("result, status", [
+    ({"new_jobs": 2, "failed_sources": []}, "success"),
+    ({"new_jobs": 0, "failed_sources": ["indeed"]}, "partial"),
+])
+def test_tracked_records_status(monkeypatch, result, status):
+    recorded = []
+    monkeypatch.setattr(scrape_scheduler, "record_run", recorded.append)
+
+    scrape_scheduler._tracked("webscraper", lambda: result)()
+
+    assert recorded[0]["status"] == status
+    assert recorded[0]["result"] == result
+    assert recorded[0]["duration_seconds"] >= 0
+    if status == "partial":
+        assert recorded[0]["failed_sources"] == ["indeed"]
+
+
+def test_tracked_records_errors(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(scrape_scheduler, "record_run", recorded.append)
+
+    def job():
+        raise RuntimeError("Scraping failed for every source: indeed")
+
+    scrape_scheduler._tracked("webscraper", job)()
+
+    assert recorded[0]["status"] == "error"
+    assert "every source" in recorded[0]["error"]
+
+
+def test_start_scheduler_hands_over_leadership(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_scheduler, "LEADER_RETRY_SECONDS", 0.1)
+    path = str(tmp_path / "scheduler.lock")
+
+    def webscraper():
+        return None
+
+    first_lock, second_lock = LeaderLock(path), LeaderLock(path)
+    first = start_scheduler(webscraper, "16:00", first_lock)
+    second = start_scheduler(webscraper, "16:00", second_lock)
+    try:
+        assert first.get_job("webscraper") is not None
+        assert second.get_job("webscraper") is None
+        assert second.get_job("leader_election") is not None
+
+        first.shutdown()
+        first_lock.release()
+        deadline = time.monotonic() + 5
+        while second.get_job("webscraper") is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert second_lock.is_leader
+        assert second.get_job("webscraper") is not None
+        assert second.get_job("leader_election") is None
+    finally:
+        second.shutdown()